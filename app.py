@@ -1,20 +1,101 @@
-import logging
 import os
+
+# Must run before anything imports socket/ssl: with gevent gunicorn workers
+# this makes `requests` yield to other greenlets during Slack round trips.
+if os.getenv("GEVENT") == "1":
+    from gevent import monkey
+
+    monkey.patch_all()
+
+import atexit
+import logging
 import hmac
 import hashlib
+import itertools
 import json
-import uuid
-from functools import lru_cache
-from flask import Flask, request, jsonify, abort
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request, jsonify, abort
 from werkzeug.exceptions import HTTPException
 
 try:
     import requests  # slack notification
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 except ImportError:  # optional; you can also vendor something else or skip Slack
     requests = None
 
-@lru_cache(maxsize=1)
-def _secrets_json() -> dict:
+try:
+    import orjson  # 2-5x faster than stdlib json on the hot path
+except ImportError:  # optional; stdlib json works too, just slower
+    orjson = None
+
+if orjson is not None:
+    _json_loads = orjson.loads
+
+    def _json_dumps_bytes(obj) -> bytes:
+        return orjson.dumps(obj)
+else:
+    _json_loads = json.loads
+
+    def _json_dumps_bytes(obj) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+# Reuse one session (and its connection pool) for all Slack posts so we don't
+# pay a fresh TCP + TLS handshake to hooks.slack.com on every webhook.
+# Transient failures retry inside urllib3 on the pooled connection, so a
+# blip doesn't silently drop a notification.
+if requests is not None:
+    _slack_retry = Retry(
+        total=2,
+        backoff_factor=0.2,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("POST",),
+    )
+    _slack_session = requests.Session()
+    _slack_session.mount(
+        "https://",
+        HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=_slack_retry),
+    )
+    _slack_session.headers.update({"Content-Type": "application/json"})
+    atexit.register(_slack_session.close)
+else:
+    _slack_session = None
+
+# Log-correlation ids only need to be unique per process; a pid + start-time
+# prefix plus a GIL-protected counter is far cheaper than uuid4's urandom
+# read and 36-char formatting.
+_req_counter = itertools.count()
+_req_prefix = f"{os.getpid():x}-{int(time.time()):x}-"
+
+
+def _next_request_id() -> str:
+    return _req_prefix + format(next(_req_counter), "x")
+
+
+# Slack notifications run off the request thread so the webhook can return
+# 200 to Expo right after signature verification instead of blocking up to
+# 5s on Slack's round trip. The queue is bounded so a Slack outage can't
+# pile up unbounded pending work.
+_MAX_PENDING_NOTIFICATIONS = 100
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="slack")
+atexit.register(_executor.shutdown)
+
+
+def _submit_notification(payload: dict) -> None:
+    if _executor._work_queue.qsize() >= _MAX_PENDING_NOTIFICATIONS:
+        logger.warning("Slack notification queue full; dropping notification")
+        return
+    _executor.submit(_notify_slack_safe, payload)
+
+
+def _notify_slack_safe(payload: dict) -> None:
+    try:
+        notify_slack(payload)
+    except Exception:
+        logger.exception("Failed to send Slack notification")
+
+def _load_secrets_json() -> dict:
     raw = os.getenv("APP_SECRETS_JSON", "")
     if not raw:
         return {}
@@ -26,6 +107,11 @@ def _secrets_json() -> dict:
         return {}
 
 
+# Env can't change at runtime, so parse the secrets blob once at import
+# instead of paying lru_cache's lookup on every getenv call.
+_SECRETS = _load_secrets_json()
+
+
 def getenv(name: str, default: str = "") -> str:
     # Local/dev: let developers keep using plain env vars
     v = os.getenv(name)
@@ -33,18 +119,85 @@ def getenv(name: str, default: str = "") -> str:
         return v
 
     # Production: values come via APP_SECRETS_JSON
-    return str(_secrets_json().get(name, default))
+    return str(_SECRETS.get(name, default))
 
 
 WEBHOOK_SECRET = getenv("WEBHOOK_SECRET", "")  # must match the SECRET set in `eas webhook:create`
 SLACK_WEBHOOK_URL = getenv("SLACK_WEBHOOK_URL", "")  # paste your Slack URL here or export it
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
+# Precompute the HMAC-SHA1 inner/outer pad contexts once (RFC 2104). Each
+# request then only copies a seeded sha1 context and hashes the body, instead
+# of redoing the key-padding setup that hmac.new performs per call.
+if WEBHOOK_SECRET:
+    _hmac_key = WEBHOOK_SECRET.encode("utf-8")
+    if len(_hmac_key) > 64:
+        _hmac_key = hashlib.sha1(_hmac_key).digest()
+    _hmac_key = _hmac_key.ljust(64, b"\0")
+    _hmac_inner = hashlib.sha1(bytes(b ^ 0x36 for b in _hmac_key))
+    _hmac_outer = hashlib.sha1(bytes(b ^ 0x5C for b in _hmac_key))
+    del _hmac_key
+else:
+    _hmac_inner = _hmac_outer = None
+
+# Resolved once: which parts of the webhook pipeline are actually configured.
+_VERIFY = bool(WEBHOOK_SECRET)
+_NOTIFY = bool(SLACK_WEBHOOK_URL) and requests is not None
+
+# Build metadata can't change while the process runs; resolve it once at
+# import instead of walking os.environ on every request.
+_APP_VERSION = os.getenv("APP_VERSION") or os.getenv("SOURCE_COMMIT", "unknown")
+_COMMIT_SHA = os.getenv("COMMIT_SHA") or os.getenv("SOURCE_COMMIT", "unknown")
+_BUILD_DATE = os.getenv("BUILD_DATE", "unknown")
+_GIT_BRANCH = os.getenv("GIT_BRANCH") or os.getenv("COOLIFY_BRANCH", "unknown")
+
+_VERSION_BODY = _json_dumps_bytes({
+    "version": _APP_VERSION,
+    "commit_sha": _COMMIT_SHA,
+    "build_date": _BUILD_DATE,
+    "branch": _GIT_BRANCH,
+})
+
+# Load balancers poll /health constantly and every field is fixed at process
+# start, so serialize the body once too.
+_HEALTH_BODY = _json_dumps_bytes({
+    "status": "ok",
+    "version": _APP_VERSION,
+    "slack_configured": bool(SLACK_WEBHOOK_URL),
+    "requests_available": requests is not None,
+})
+
+# Configure logging. Skip the thread/process lookups logging would
+# otherwise do for every record; nothing in our format uses them.
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+
+class _CachedTimeFormatter(logging.Formatter):
+    """
+    Formatter that reuses the rendered timestamp while the second hasn't
+    changed. time.strftime dominates per-record cost with the default
+    asctime format, and a webhook's 2-3 log lines land within one second.
+    """
+
+    _last_sec = -1
+    _last_str = ""
+
+    def formatTime(self, record, datefmt=None):
+        sec = int(record.created)
+        if sec != _CachedTimeFormatter._last_sec:
+            _CachedTimeFormatter._last_sec = sec
+            _CachedTimeFormatter._last_str = time.strftime(
+                datefmt or "%Y-%m-%d %H:%M:%S", time.localtime(sec)
+            )
+        return _CachedTimeFormatter._last_str
+
+
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(
+    _CachedTimeFormatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
 )
+logging.basicConfig(level=logging.INFO, handlers=[_log_handler])
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
@@ -68,18 +221,68 @@ def internal_error(error):
     logger.exception("Internal server error")
     return jsonify(error="Internal server error"), 500
 
-def verify_expo_signature(raw_body: bytes, expo_sig: str | None) -> bool:
+
+@app.errorhandler(Exception)
+def unexpected_error(error):
+    # Let aborts and other HTTP errors keep their status; everything else
+    # becomes a logged 500. Replaces the per-request try/except wrapper the
+    # webhook view used to carry.
+    if isinstance(error, HTTPException):
+        return error
+    logger.exception("Unexpected error processing request")
+    return jsonify(error="Internal server error"), 500
+
+_BODY_CHUNK_SIZE = 64 * 1024
+
+
+def _signature_shape_ok(expo_sig: str | None) -> bool:
+    # A valid value is exactly "sha1=" plus 40 hex chars. These checks
+    # involve no key material, so they don't weaken the compare_digest
+    # timing property.
+    if not expo_sig:
+        return False
+    if len(expo_sig) != 45 or not expo_sig.startswith("sha1="):
+        return False
+    try:
+        bytes.fromhex(expo_sig[5:])
+    except ValueError:
+        return False
+    return True
+
+
+def _read_and_verify(expo_sig: str | None, keep_body: bool = True) -> tuple[bytes, bool]:
     """
-    Expo's sample uses sha1 and the `expo-signature` header.
-    We compute: sha1=<hex>
+    Stream the request body in 64KB chunks, feeding the HMAC as we go, and
+    return `(raw_body, signature_ok)`.
+
+    Expo's sample uses sha1 and the `expo-signature` header; we compute
+    sha1=<hex>. Chunked reads keep the working set cache-sized during the
+    SHA-1 pass instead of materializing up to 10MB before hashing. A missing
+    or malformed header 401s without reading the body at all, so an
+    unauthenticated POST can't make us buffer 10MB of garbage. Werkzeug's
+    limited stream enforces MAX_CONTENT_LENGTH for us.
     """
     if not WEBHOOK_SECRET:  # allow running locally without a secret
-        return True
-    if not expo_sig:
-        return False
-    mac = hmac.new(WEBHOOK_SECRET.encode("utf-8"), raw_body, hashlib.sha1)
-    expected = "sha1=" + mac.hexdigest()
-    return hmac.compare_digest(expected, expo_sig)
+        return request.get_data(), True
+    if not _signature_shape_ok(expo_sig):
+        return b"", False
+
+    inner = _hmac_inner.copy()
+    chunks = []
+    stream = request.stream
+    while True:
+        chunk = stream.read(_BODY_CHUNK_SIZE)
+        if not chunk:
+            break
+        inner.update(chunk)
+        if keep_body:
+            chunks.append(chunk)
+    outer = _hmac_outer.copy()
+    outer.update(inner.digest())
+    expected = "sha1=" + outer.hexdigest()
+    if not hmac.compare_digest(expected, expo_sig):
+        return b"", False
+    return b"".join(chunks), True
 
 def notify_slack(payload: dict) -> None:
     if not SLACK_WEBHOOK_URL:
@@ -89,24 +292,35 @@ def notify_slack(payload: dict) -> None:
         logger.warning("`requests` not installed; skipping Slack notify")
         return
 
-    status = payload.get("status")
-    account = payload.get("accountName")
-    project = payload.get("projectName")
-    platform = payload.get("platform")
-    url = payload.get("buildDetailsPageUrl")
-    error = (payload.get("error") or {}).get("message")
+    status, account, project, platform, url, err_obj = (
+        payload.get(k)
+        for k in (
+            "status",
+            "accountName",
+            "projectName",
+            "platform",
+            "buildDetailsPageUrl",
+            "error",
+        )
+    )
+    error = (err_obj or {}).get("message")
 
-    text = f"EAS build *{status}* for `{account}/{project}` on *{platform}*"
+    parts = [f"EAS build *{status}* for `{account}/{project}` on *{platform}*"]
     if url:
-        text += f"\n{url}"
+        parts.append(url)
     if error:
-        text += f"\nError: `{error}`"
+        parts.append(f"Error: `{error}`")
+    text = "\n".join(parts)
+
+    # Slack webhook payloads are always {"text": ...}; encoding just the
+    # string and splicing it into the fixed wrapper skips the per-call dict
+    # encode, and a JSON string encoder only escapes + quotes.
+    body = b'{"text":' + _json_dumps_bytes(text) + b"}"
 
     try:
-        resp = requests.post(
+        resp = _slack_session.post(
             SLACK_WEBHOOK_URL,
-            headers={"Content-Type": "application/json"},
-            data=json.dumps({"text": text}),
+            data=body,
             timeout=5,
         )
         logger.info("Slack response %s %s", resp.status_code, resp.text)
@@ -115,67 +329,84 @@ def notify_slack(payload: dict) -> None:
 
 @app.get("/health")
 def health():
-    checks = {
-        "status": "ok",
-        "version": os.getenv("APP_VERSION", "unknown"),
-        "slack_configured": bool(SLACK_WEBHOOK_URL),
-        "requests_available": requests is not None,
-    }
-    status_code = 200 # if checks["slack_configured"] and checks["requests_available"] else 503
-    return jsonify(checks), status_code
+    return Response(_HEALTH_BODY, mimetype="application/json")
 
 
 @app.get("/version")
 def version():
-    return jsonify({
-        "version": os.getenv("APP_VERSION") or os.getenv("SOURCE_COMMIT", "unknown"),
-        "commit_sha": os.getenv("COMMIT_SHA") or os.getenv("SOURCE_COMMIT", "unknown"),
-        "build_date": os.getenv("BUILD_DATE", "unknown"),
-        "branch": os.getenv("GIT_BRANCH") or os.getenv("COOLIFY_BRANCH", "unknown"),
-    })
+    return Response(_VERSION_BODY, mimetype="application/json")
+
+
+def _full_webhook():
+    # Bind the request id once instead of allocating an extra= dict for
+    # every log line; the adapter reuses the same dict by reference.
+    log = logging.LoggerAdapter(logger, {"request_id": _next_request_id()})
+    log.info("Webhook request received")
 
+    expo_sig = request.headers.get("expo-signature")  # case-insensitive
+    raw, sig_ok = _read_and_verify(expo_sig)  # IMPORTANT: HMAC over raw bytes
 
-@app.post("/webhook")
-def webhook():
-    request_id = str(uuid.uuid4())
-    logger.info("Webhook request received", extra={"request_id": request_id})
+    if not sig_ok:
+        log.warning("Signature verification failed")
+        abort(401, description="Signatures didn't match!")
 
+    # Parse the bytes we already hold rather than request.get_json, which
+    # would re-run get_data plus MIME inspection inside Werkzeug. ValueError
+    # covers both orjson.JSONDecodeError and json.JSONDecodeError.
     try:
-        raw = request.get_data()  # IMPORTANT: use raw bytes for HMAC
-        expo_sig = request.headers.get("expo-signature")  # case-insensitive
-
-        if not verify_expo_signature(raw, expo_sig):
-            logger.warning("Signature verification failed", extra={"request_id": request_id})
-            abort(401, description="Signatures didn't match!")
-
-        # Parse JSON with proper error handling
-        try:
-            payload = request.get_json(force=True)
-            if payload is None:
-                logger.warning("Empty or invalid JSON payload", extra={"request_id": request_id})
-                abort(400, description="Invalid JSON payload")
-        except Exception as e:
-            logger.error("JSON parsing failed", extra={"request_id": request_id, "error": str(e)})
+        payload = _json_loads(raw) if raw else None
+        if payload is None:
+            log.warning("Empty or invalid JSON payload")
             abort(400, description="Invalid JSON payload")
+    except ValueError as e:
+        log.error("JSON parsing failed: %s", e)
+        abort(400, description="Invalid JSON payload")
 
-        # Validate required fields
-        if not isinstance(payload, dict):
-            logger.warning("Payload is not a dictionary", extra={"request_id": request_id})
-            abort(400, description="Payload must be a JSON object")
+    # Validate required fields; exact type check — the parsers only ever
+    # produce plain dicts and `type is` skips the MRO walk.
+    if type(payload) is not dict:
+        log.warning("Payload is not a dictionary")
+        abort(400, description="Payload must be a JSON object")
+
+    _submit_notification(payload)
+
+    log.info("Webhook processed successfully")
+    return jsonify(ok=True)
+
+
+def _verify_only_webhook():
+    request_id = _next_request_id()
+    expo_sig = request.headers.get("expo-signature")  # case-insensitive
+    _, sig_ok = _read_and_verify(expo_sig, keep_body=False)
+
+    if not sig_ok:
+        logger.warning("Signature verification failed", extra={"request_id": request_id})
+        abort(401, description="Signatures didn't match!")
+
+    return jsonify(ok=True)
+
+
+def _noop_webhook():
+    return jsonify(ok=True)
 
-        notify_slack(payload)
 
-        logger.info("Webhook processed successfully", extra={"request_id": request_id})
-        return jsonify(ok=True)
+# Specialize the view at import time so each request only pays for the work
+# the current configuration can use. _full_webhook also covers the
+# Slack-but-no-secret case: _read_and_verify no-ops without a secret.
+if _NOTIFY:
+    _webhook_view = _full_webhook
+elif _VERIFY:
+    _webhook_view = _verify_only_webhook
+else:
+    _webhook_view = _noop_webhook
 
-    except HTTPException:
-        # Re-raise HTTP exceptions (from abort()) so Flask handles them properly
-        raise
-    except Exception as e:
-        logger.exception("Unexpected error processing webhook", extra={"request_id": request_id})
-        abort(500, description="Internal server error")
+app.add_url_rule("/webhook", "webhook", _webhook_view, methods=["POST"])
 
 
 if __name__ == "__main__":
-    port = int(os.getenv("PORT", "3000"))
-    app.run(host="0.0.0.0", port=port)
+    raise SystemExit(
+        "The Flask dev server is single-threaded and blocks on Slack I/O; "
+        "run under gunicorn instead:\n"
+        "  GEVENT=1 gunicorn -k gevent -w 2 --worker-connections 1000 "
+        "-b 0.0.0.0:${PORT:-3000} app:app"
+    )